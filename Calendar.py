@@ -2,19 +2,59 @@ import os
 import json
 import logging
 import time
+import threading
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from datetime import datetime
+from datetime import datetime, timedelta
 from dateutil import parser
 import pytz
-from config import TIMEZONE, TOKEN_FILE, CREDENTIALS_FILE
+from config import TIMEZONE, TOKEN_FILE, CREDENTIALS_FILE, AGENDA_CACHE_TTL, CALENDAR_PAGE_SIZE
 from logging_config import setup_logger
+from profiling import profiler
 
 # Configurar logger
 logger = setup_logger(__name__)
 
+# Respuestas parciales: solo los campos que se usan
+CALENDAR_LIST_FIELDS = 'nextPageToken,items(id,summary,colorId)'
+EVENT_FIELDS = 'nextPageToken,items(summary,start(date,dateTime),end(date,dateTime))'
+
+class CalendarEvent:
+    """Evento reducido a los campos que usa el chatbot"""
+    __slots__ = ('summary', 'start', 'end', 'all_day')
+
+    def __init__(self, summary, start, end, all_day):
+        self.summary = summary
+        self.start = start
+        self.end = end
+        self.all_day = all_day
+
+    @classmethod
+    def from_api(cls, item):
+        """Convierte un evento de la API en un CalendarEvent"""
+        start = item.get('start', {})
+        end = item.get('end', {})
+        all_day = 'date' in start
+        return cls(
+            item.get('summary', '(Sin título)'),
+            start.get('date') if all_day else start.get('dateTime'),
+            end.get('date') if all_day else end.get('dateTime'),
+            all_day
+        )
+
+def iter_pages(request_factory, span_name):
+    """Recorre todas las páginas de un listado de la API siguiendo nextPageToken"""
+    page_token = None
+    while True:
+        with profiler.span(span_name):
+            result = request_factory(page_token).execute()
+        yield from result.get('items', [])
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            break
+
 class Calendar:
     def __init__(self, calendars_env) -> None:
         """Inicializa la clase Calendar"""
@@ -25,6 +65,15 @@ class Calendar:
             raise ValueError("No se ha definido la variable CALENDAR_LIST")
             
         self.calendars_env = calendars_env
+
+        # Cachés: servicio de la API (uno por hilo, httplib2 no es thread-safe),
+        # calendarios resueltos y agenda del día
+        self.local = threading.local()
+        self.cache_lock = threading.Lock()
+        self.calendar_ids = {}
+        self.calendar_colors = {}
+        self.agenda_cache = {}
+
         # Crear directorio para credenciales
         os.makedirs(os.path.dirname(TOKEN_FILE), exist_ok=True)
 
@@ -32,10 +81,12 @@ class Calendar:
         """Obtiene credenciales para Google Calendar API"""
         try:
             if os.path.exists(TOKEN_FILE):
-                creds = Credentials.from_authorized_user_file(TOKEN_FILE, self.SCOPES)
+                with profiler.span('credenciales'):
+                    creds = Credentials.from_authorized_user_file(TOKEN_FILE, self.SCOPES)
                 
                 if creds and creds.expired and creds.refresh_token:
-                    creds.refresh(Request())
+                    with profiler.span('oauth_refresh'):
+                        creds.refresh(Request())
                     with open(TOKEN_FILE, 'w') as token_file:
                         token_file.write(creds.to_json())
                         
@@ -66,7 +117,7 @@ class Calendar:
         """Verifica y renueva el token si está próximo a expirar"""
         try:
             if os.path.exists(TOKEN_FILE):
-                with open(TOKEN_FILE, 'r') as f:
+                with profiler.span('token_file'), open(TOKEN_FILE, 'r') as f:
                     token_data = json.load(f)
                 
                 # Verificar si el token expirará pronto (en los próximos 30 minutos)
@@ -81,7 +132,8 @@ class Calendar:
                     if refresh_token:
                         # Usar el refresh_token para obtener un nuevo token
                         creds = Credentials.from_authorized_user_info(token_data, self.SCOPES)
-                        creds.refresh(Request())
+                        with profiler.span('oauth_refresh'):
+                            creds.refresh(Request())
                         
                         # Guardar el nuevo token
                         with open(TOKEN_FILE, 'w') as token:
@@ -118,87 +170,160 @@ class Calendar:
         }
         return COLOR_EMOJI_MAP.get(color_id, '🔘')
 
-    def get_calendar_events(self, timezone=TIMEZONE):
-        """Obtiene eventos del calendario para hoy"""
+    def get_service(self):
+        """Devuelve el servicio de Calendar del hilo actual, reutilizándolo si las credenciales siguen válidas"""
+        service = getattr(self.local, 'service', None)
+        if service is None or not self.local.creds.valid:
+            self.local.creds = self.get_credentials()
+            with profiler.span('google_discovery'):
+                service = build('calendar', 'v3', credentials=self.local.creds)
+            self.local.service = service
+        return service
+
+    def resolve_calendars(self, service):
+        """Resuelve (una vez) los IDs y colores de los calendarios configurados"""
+        if self.calendar_ids:
+            return self.calendar_ids, self.calendar_colors
+
+        calendar_names = [name.strip() for name in self.calendars_env.split(',')]
+
+        available_calendars = iter_pages(
+            lambda page_token: service.calendarList().list(
+                pageToken=page_token, fields=CALENDAR_LIST_FIELDS),
+            'calendar_list')
+
+        calendar_ids = {}
+        calendar_colors = {}
+        for calendar in available_calendars:
+            calendar_name = calendar.get('summary')
+            if calendar_name in calendar_names:
+                calendar_ids[calendar_name] = calendar.get('id')
+                calendar_colors[calendar_name] = calendar.get('colorId')
+
+        if not calendar_ids:
+            logger.error("No se encontraron calendarios coincidentes")
+            raise ValueError("No se encontraron calendarios coincidentes")
+
+        with self.cache_lock:
+            self.calendar_ids = calendar_ids
+            self.calendar_colors = calendar_colors
+        return calendar_ids, calendar_colors
+
+    @staticmethod
+    def iter_events(service, calendar_id, time_min, time_max):
+        """Genera todos los eventos del intervalo, página a página y con respuesta parcial"""
+        items = iter_pages(
+            lambda page_token: service.events().list(
+                calendarId=calendar_id, timeMin=time_min, timeMax=time_max,
+                maxResults=CALENDAR_PAGE_SIZE, singleEvents=True, orderBy='startTime',
+                pageToken=page_token, fields=EVENT_FIELDS),
+            'calendar_events')
+        for item in items:
+            yield CalendarEvent.from_api(item)
+
+    def get_calendar_events(self, timezone=TIMEZONE, days_ahead=0):
+        """Obtiene eventos del calendario para hoy (o dentro de days_ahead días)"""
+        local_tz = pytz.timezone(timezone)
+        now = datetime.now(local_tz) + timedelta(days=days_ahead)
+        fecha = now.date().isoformat()
+        dia_texto = "Hoy" if days_ahead == 0 else "Mañana" if days_ahead == 1 else f"El {now.strftime('%d/%m')}"
+
+        # Agenda del día en caché si es reciente
+        agenda = self.agenda_cache.get(fecha)
+        if agenda and time.time() - agenda['obtenido'] < AGENDA_CACHE_TTL:
+            return list(agenda['events']), list(agenda['birthdays']), list(agenda['all_day_events'])
+
         # Primero verificar y refrescar el token si es necesario
         if not self.check_and_refresh_token():
             logger.warning("No se pudo verificar/refrescar el token")
             
         try:
-            calendar_names = [name.strip() for name in self.calendars_env.split(',')]
-            
-            creds = self.get_credentials()
-            service = build('calendar', 'v3', credentials=creds)
+            service = self.get_service()
 
-            local_tz = pytz.timezone(timezone)
-            now = datetime.now(local_tz)
             start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
             end_of_day = now.replace(hour=23, minute=59, second=59, microsecond=999999).isoformat()
 
             event_list = []
             birthday_list = []
             all_day_events = []
+            fetch_failed = False
 
-            calendar_list = service.calendarList().list().execute()
-            available_calendars = calendar_list.get('items', [])
-
-            calendar_ids = {}
-            calendar_colors = {}
-            for calendar in available_calendars:
-                calendar_name = calendar.get('summary')
-                if calendar_name in calendar_names:
-                    calendar_ids[calendar_name] = calendar.get('id')
-                    calendar_colors[calendar_name] = calendar.get('colorId')
-
-            if not calendar_ids:
-                logger.error("No se encontraron calendarios coincidentes")
-                raise ValueError("No se encontraron calendarios coincidentes")
+            calendar_ids, calendar_colors = self.resolve_calendars(service)
             
             for calendar_name, calendar_id in calendar_ids.items():
                 color_emoji = self.get_emoji_for_color(calendar_colors.get(calendar_name))
                 try:
-                    events_result = service.events().list(
-                        calendarId=calendar_id, timeMin=start_of_day, timeMax=end_of_day,
-                        maxResults=10, singleEvents=True, orderBy='startTime').execute()
-                    events = events_result.get('items', [])
-                    
-                    for event in events:
-                        start = event['start'].get('dateTime', event['start'].get('date'))
-                        end = event['end'].get('dateTime', event['end'].get('date'))
-                        summary = event['summary']
-
-                        if event.get('start').get('dateTime') and event.get('end').get('dateTime'):
-                            start_formatted = self.format_event_time(start)
-                            end_formatted = self.format_event_time(end)
-                            event_list.append({
-                                'start': start,
-                                'description': f"{color_emoji} De {start_formatted} a {end_formatted}: {summary}"
-                            })
-                        
-                        if event.get('start').get('date') and calendar_name.lower() != "cumpleaños":
-                            all_day_events.append(f"{color_emoji} Hoy es el día de {summary}")
+                    for event in self.iter_events(service, calendar_id, start_of_day, end_of_day):
+                        if not event.all_day and event.start and event.end:
+                            start_formatted = self.format_event_time(event.start)
+                            end_formatted = self.format_event_time(event.end)
+                            event_list.append((
+                                event.start,
+                                f"{color_emoji} De {start_formatted} a {end_formatted}: {event.summary}"
+                            ))
+
+                        # Los cumpleaños salen de la misma consulta, sin una llamada extra
+                        if calendar_name == "Cumpleaños":
+                            birthday_list.append(f"🎂 {dia_texto} es el cumpleaños de {event.summary}")
+                        elif event.all_day and calendar_name.lower() != "cumpleaños":
+                            all_day_events.append(f"{color_emoji} {dia_texto} es el día de {event.summary}")
                             
                 except Exception as e:
                     logger.error(f"Error al obtener eventos de {calendar_name}: {e}")
+                    fetch_failed = True
                     continue
 
-            if "Cumpleaños" in calendar_ids:
-                try:
-                    birthdays_result = service.events().list(
-                        calendarId=calendar_ids["Cumpleaños"], timeMin=start_of_day, timeMax=end_of_day,
-                        maxResults=10, singleEvents=True, orderBy='startTime').execute()
-                    birthday_events = birthdays_result.get('items', [])
-
-                    for birthday in birthday_events:
-                        birthday_list.append(f"🎂 Hoy es el cumpleaños de {birthday['summary']}")
-                except Exception as e:
-                    logger.error(f"Error al obtener cumpleaños: {e}")
+            event_list.sort(key=lambda x: x[0])
+            sorted_events = [description for _, description in event_list]
 
-            event_list.sort(key=lambda x: x['start'])
-            sorted_events = [event['description'] for event in event_list]
+            # Solo se guarda en caché una agenda completa
+            if not fetch_failed:
+                today = datetime.now(local_tz).date().isoformat()
+                agenda_cache = {f: a for f, a in self.agenda_cache.items() if f >= today}
+                agenda_cache[fecha] = {
+                    'obtenido': time.time(),
+                    'events': sorted_events,
+                    'birthdays': birthday_list,
+                    'all_day_events': all_day_events
+                }
+                with self.cache_lock:
+                    self.agenda_cache = agenda_cache
             
             return sorted_events, birthday_list, all_day_events
             
         except Exception as e:
             logger.error(f"Error al obtener eventos: {e}")
             return [], [], []
+
+    def export_cache(self):
+        """Devuelve las cachés calientes en formato serializable"""
+        # Copias bajo el lock: otros hilos reemplazan estas cachés mientras se guarda
+        with self.cache_lock:
+            return {
+                'calendars_env': self.calendars_env,
+                'calendar_ids': dict(self.calendar_ids),
+                'calendar_colors': dict(self.calendar_colors),
+                'agenda': dict(self.agenda_cache)
+            }
+
+    def import_cache(self, data):
+        """Restaura las cachés desde una instantánea"""
+        # Los calendarios resueltos solo valen si la configuración no ha cambiado
+        if data.get('calendars_env') != self.calendars_env:
+            logger.info("La lista de calendarios ha cambiado, se ignora la caché")
+            return
+        with self.cache_lock:
+            self.calendar_ids = data.get('calendar_ids') or {}
+            self.calendar_colors = data.get('calendar_colors') or {}
+            self.agenda_cache = data.get('agenda') or {}
+        logger.info(f"Caché de calendario restaurada: {len(self.calendar_ids)} calendarios")
+
+    def warm_up(self, timezone=TIMEZONE):
+        """Precarga los calendarios y la agenda del día; indica si la agenda de hoy quedó en caché"""
+        # Sin token.json get_credentials lanzaría el flujo OAuth interactivo, que bloquea
+        if not os.path.exists(TOKEN_FILE):
+            logger.warning(f"No existe {TOKEN_FILE}; la precarga no lanza la autenticación interactiva")
+            return False
+        self.get_calendar_events(timezone)
+        today = datetime.now(pytz.timezone(timezone)).date().isoformat()
+        return today in self.agenda_cache
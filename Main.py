@@ -1,20 +1,31 @@
+import atexit
 import random
 import schedule
+import signal
+import sys
 import time
 import threading
+from datetime import timedelta
 from flask import Flask, request
 from twilio.rest import Client
 from twilio.twiml.messaging_response import MessagingResponse
+from twilio.request_validator import RequestValidator
 
 from config import (
     AEMET_API_KEY, TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_NUMBER, 
     DEST_NUMBER, CALENDAR_LIST, DEFAULT_LOCATION, DEFAULT_MUNICIPALITY, 
     DEFAULT_USER_NAME, GREETING_EMOJIS, DAILY_UPDATE_TIME, FLASK_HOST, 
-    FLASK_PORT, DEBUG_MODE, TOKEN_CHECK_INTERVAL
+    FLASK_PORT, DEBUG_MODE, TOKEN_CHECK_INTERVAL, CACHE_SNAPSHOT_INTERVAL,
+    ADMIN_NUMBER, WARM_UP_DEADLINE, WARM_UP_RETRY_INTERVAL, TWILIO_WEBHOOK_URL
 )
-from Weather import Weather
+from Weather import Weather, fecha_hoy
 from Calendar import Calendar
 from logging_config import setup_logger
+from cache_snapshot import save_snapshot, load_snapshot
+from traffic_capture import TrafficCapture
+from command_router import CommandRouter, find_cuando, find_lugar
+from profiling import profiler
+from digest import render_greeting, render_weather, render_events, render_resumen_dias, pack_messages
 from state_management import (
     load_state, update_last_run_time, get_last_run_time, 
     update_location, get_location
@@ -23,6 +34,12 @@ from state_management import (
 # Configurar logger
 logger = setup_logger(__name__)
 
+def parse_perfilado(tokens):
+    """Argumentos de 'perfilado': on/off o tasa, y modo opcional"""
+    valor = next((t for t in tokens if t in ('on', 'off') or t[0].isdigit()), None)
+    modo = next((t for t in tokens if t in ('cprofile', 'sampling')), None)
+    return {'valor': valor, 'modo': modo}
+
 class Main:
     
     def __init__(self) -> None:
@@ -49,6 +66,7 @@ class Main:
         # Inicializar cliente de Twilio
         try:
             self.client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+            self.request_validator = RequestValidator(TWILIO_AUTH_TOKEN)
             self.to = DEST_NUMBER
             self._from = TWILIO_NUMBER
         except Exception as e:
@@ -66,9 +84,16 @@ class Main:
             logger.error(f"Error al inicializar componentes: {e}")
             raise
 
+        # Captura opcional de tráfico del webhook
+        self.traffic_capture = TrafficCapture()
+
         # Lock para evitar duplicados
         self.scheduler_lock = threading.Lock()
 
+        # Restaurar cachés de la última ejecución
+        self.caches_ready = threading.Event()
+        self.restore_cache_snapshot()
+
         # Programar el envío diario
         schedule.every().day.at(DAILY_UPDATE_TIME).do(self.safe_send_daily_update)
         logger.info(f"Programador configurado para las {DAILY_UPDATE_TIME}")
@@ -77,10 +102,15 @@ class Main:
         schedule.every(TOKEN_CHECK_INTERVAL).minutes.do(self.check_and_refresh_token)
         logger.info(f"Scheduler de renovación de token configurado cada {TOKEN_CHECK_INTERVAL} minutos")
 
-        # Definir rutas de Flask
+        # Guardar instantánea de cachés cada n minutos
+        schedule.every(CACHE_SNAPSHOT_INTERVAL).minutes.do(self.save_cache_snapshot)
+
+        # Definir comandos y rutas de Flask
+        self.setup_commands()
         self.setup_routes()
         logger.info("Aplicación iniciada correctamente")
 
+    @profiler.profiled('check_and_refresh_token')
     def check_and_refresh_token(self):
         """Verifica y renueva el token de Google Calendar"""
         try:
@@ -95,14 +125,80 @@ class Main:
             logger.error(f"Error al actualizar token desde Main: {e}")
             return False
             
+    def restore_cache_snapshot(self):
+        """Restaura las cachés desde la instantánea en disco"""
+        caches = load_snapshot()
+        if not caches:
+            logger.info("Sin instantánea de caché válida, arranque en frío")
+            return False
+        self.weather.import_cache(caches.get('weather', {}))
+        self.calendar.import_cache(caches.get('calendar', {}))
+        return True
+
+    def save_cache_snapshot(self):
+        """Guarda las cachés calientes en disco"""
+        return save_snapshot(lambda: {
+            'weather': self.weather.export_cache(),
+            'calendar': self.calendar.export_cache()
+        })
+
+    def warm_up(self):
+        """Precarga las cachés en segundo plano y marca la instancia como lista.
+
+        Reintenta cada WARM_UP_RETRY_INTERVAL segundos. Un temporizador
+        independiente marca la instancia como lista a los WARM_UP_DEADLINE
+        segundos aunque un intento siga bloqueado, para no quedar fuera para siempre.
+        """
+        logger.info("Iniciando precarga de cachés")
+        self.warm_up_status = {'tiempo': False, 'agenda': False}
+        deadline_timer = threading.Timer(WARM_UP_DEADLINE, self.force_ready)
+        deadline_timer.daemon = True
+        deadline_timer.start()
+
+        while not self.caches_ready.is_set():
+            if not self.warm_up_status['tiempo']:
+                try:
+                    self.warm_up_status['tiempo'] = self.weather.warm_up(self.current_location)
+                    if not self.warm_up_status['tiempo']:
+                        logger.warning("No se pudo precargar el tiempo")
+                except Exception as e:
+                    logger.error(f"Error al precargar el tiempo: {e}")
+            if not self.warm_up_status['agenda']:
+                try:
+                    self.warm_up_status['agenda'] = self.calendar.warm_up()
+                    if not self.warm_up_status['agenda']:
+                        logger.warning("No se pudo precargar la agenda")
+                except Exception as e:
+                    logger.error(f"Error al precargar la agenda: {e}")
+
+            if all(self.warm_up_status.values()):
+                deadline_timer.cancel()
+                self.caches_ready.set()
+                logger.info("Precarga de cachés completada")
+                break
+            # Espera al siguiente intento salvo que el temporizador fuerce el estado ready
+            self.caches_ready.wait(WARM_UP_RETRY_INTERVAL)
+
+        self.save_cache_snapshot()
+
+    def force_ready(self):
+        """Marca la instancia como lista al agotarse el plazo de precarga"""
+        if self.caches_ready.is_set():
+            return
+        pendientes = [nombre for nombre, listo in self.warm_up_status.items() if not listo]
+        logger.error(f"Precarga incompleta tras {WARM_UP_DEADLINE} s (pendiente: {', '.join(pendientes)}); "
+                     "se fuerza el estado ready con cachés en frío")
+        self.caches_ready.set()
+
     def send_message(self, body):
         """Envía un mensaje por WhatsApp"""
         try:
-            self.client.messages.create(
-                from_=self._from,
-                body=body,
-                to=self.to
-            )
+            with profiler.span('twilio'):
+                self.client.messages.create(
+                    from_=self._from,
+                    body=body,
+                    to=self.to
+                )
             logger.info(f"Mensaje enviado a {self.to}")
             return True
         except Exception as e:
@@ -124,6 +220,7 @@ class Main:
                 logger.info("Actualización ya enviada hoy")
                 return False
 
+    @profiler.profiled('send_daily_update')
     def send_daily_update(self):
         """Envía actualización diaria de clima y eventos"""
         try:
@@ -137,132 +234,173 @@ class Main:
                 logger.error("No se pudo obtener pronóstico")
                 return False
             
-            # Mensaje 1: Buenos días
+            # Saludo, tiempo y eventos en el menor número de mensajes posible
             emoji = random.choice(self.emojis)
-            message_1 = f"Buenos días {self.user_name}!! {emoji}"
-            if not self.send_message(message_1):
-                return False
-            
-            # Mensaje 2: El tiempo
-            lluvia_text = ', '.join(weather['intervalos_lluvia']) if weather['intervalos_lluvia'] else 'No hay probabilidad de lluvia'
-            message_2 = (f"El tiempo del día en {self.current_municipality} es {emoji}:\n\n"
-                         f"Madrugada 🌄: {weather['madrugada']}\n"
-                         f"Mañana 🌅: {weather['mañana']}\n"
-                         f"Tarde 🌇: {weather['tarde']}\n"
-                         f"Noche 🌆: {weather['noche']}\n\n"
-                         f"Probabilidad de lluvia en intervalos 🌧️: {lluvia_text}")
-            if not self.send_message(message_2):
-                return False
-            
-            # Mensaje 3: Eventos
-            message_3 = "Tus eventos del día son 🗒️:\n"
-            if events:
-                for event in events:
-                    message_3 += f"{event}\n"
-            else:
-                message_3 += "No tienes eventos programados para hoy.\n"
-                
-            if birthdays:
-                message_3 += "\n" + "\n".join(birthdays)
-            if all_day_events:
-                message_3 += "\n" + "\n".join(all_day_events)
-                
-            return self.send_message(message_3)
+            sections = [
+                render_greeting(self.user_name, emoji),
+                render_weather(weather, self.current_municipality, emoji=emoji),
+                render_events(events, birthdays, all_day_events)
+            ]
+            for message in pack_messages(sections):
+                if not self.send_message(message):
+                    return False
+            return True
             
         except Exception as e:
             logger.error(f"Error en actualización diaria: {e}")
             return False
 
+    def format_resumen_dias(self, titulo, desde, hasta, location, municipality):
+        """Formatea una línea de resumen por día entre dos fechas"""
+        dias = self.weather.get_resumen_dias(location, desde, hasta)
+        if not dias:
+            return "Hubo un problema al obtener el pronóstico. Intenta más tarde."
+
+        return render_resumen_dias(titulo, municipality, dias)
+
+    def setup_commands(self):
+        """Registra los comandos del chatbot; el orden define la prioridad"""
+        self.router = CommandRouter()
+        self.router.register(
+            'tiempo', ['tiempo'], self.handle_tiempo,
+            lambda tokens: {'cuando': find_cuando(tokens), 'lugar': find_lugar(tokens)})
+        self.router.register(
+            'eventos', ['eventos'], self.handle_eventos,
+            lambda tokens: {'cuando': find_cuando(tokens)})
+        self.router.register(
+            'cambiar_ubicacion', ['cambiar ubicación', 'cambiar ubicacion'], self.handle_cambiar_ubicacion)
+        self.router.register('renovar_token', ['renovar token'], self.handle_renovar_token)
+        self.router.register('perfilado', ['perfilado'], self.handle_perfilado, parse_perfilado)
+        # Solo se busca un municipio si el mensaje no contiene ninguna palabra clave
+        self.router.set_fallback('municipio', r"(?P<nombre>[^\W\d_]+(?:[\s'-]+[^\W\d_]+)*)", self.handle_municipio)
+
+    def handle_tiempo(self, cuando=None, lugar=None):
+        """Responde con la predicción de hoy, mañana, fin de semana o semana"""
+        location, municipality = self.current_location, self.current_municipality
+        if lugar:
+            municipio = self.weather.find_municipio(lugar)
+            if not municipio:
+                return f"No se ha encontrado el municipio '{lugar}', intenta de nuevo."
+            municipality, location = municipio
+        elif not location:
+            return "No hay ubicación establecida. Usa 'cambiar ubicación'."
+
+        cuando = cuando or 'hoy'
+        # Los días de la predicción van en hora de Madrid, no en la del servidor
+        hoy = fecha_hoy()
+        if cuando == 'fin de semana':
+            return self.format_resumen_dias("el fin de semana", *Weather.fin_de_semana(hoy), location, municipality)
+        if cuando == 'semana':
+            return self.format_resumen_dias("la semana", hoy, hoy + timedelta(days=6), location, municipality)
+
+        manana = cuando == 'mañana'
+        fecha = hoy + timedelta(days=1) if manana else hoy
+        weather = self.weather.get_weather_from_aemet(location, fecha)
+        if not weather:
+            return "Hubo un problema al obtener el pronóstico. Intenta más tarde."
+
+        return render_weather(weather, municipality, titulo='de mañana' if manana else 'del día')
+
+    def handle_eventos(self, cuando=None):
+        """Responde con los eventos de hoy o de mañana"""
+        if cuando in ('semana', 'fin de semana'):
+            return "Por ahora solo puedo mostrarte los eventos de hoy o de mañana. Envía \"eventos\" o \"eventos mañana\"."
+        try:
+            # Verificar y refrescar token si es necesario
+            self.check_and_refresh_token()
+
+            manana = cuando == 'mañana'
+            events, birthdays, all_day_events = self.calendar.get_calendar_events(days_ahead=1 if manana else 0)
+
+            return render_events(events, birthdays, all_day_events, cuando='mañana' if manana else 'hoy')
+        except Exception as e:
+            logger.error(f"Error al obtener eventos: {e}")
+            return "Hubo un problema al obtener tus eventos. Intenta más tarde."
+
+    def handle_cambiar_ubicacion(self):
+        """Pide el nombre del municipio"""
+        return "Escribe el nombre de tu municipio para actualizar la ubicación."
+
+    def handle_renovar_token(self):
+        """Renueva manualmente el token de Google Calendar"""
+        try:
+            if self.check_and_refresh_token():
+                return "Token de Google Calendar verificado/renovado correctamente."
+            return "No se pudo renovar el token. Es posible que necesites reautenticarte."
+        except Exception as e:
+            logger.error(f"Error al renovar token manualmente: {e}")
+            return "Error al intentar renovar el token."
+
+    def is_admin_request(self):
+        """Comprueba que la petición viene firmada por Twilio y desde el número administrador"""
+        if not ADMIN_NUMBER or request.values.get('From') != ADMIN_NUMBER:
+            return False
+
+        # Sin firma válida el campo From puede estar falsificado
+        url = TWILIO_WEBHOOK_URL or request.url
+        signature = request.headers.get('X-Twilio-Signature', '')
+        return self.request_validator.validate(url, request.form.to_dict(), signature)
+
+    def handle_perfilado(self, valor=None, modo=None):
+        """Activa o desactiva el perfilado en caliente (solo administrador)"""
+        if not self.is_admin_request():
+            logger.warning("Intento no autorizado de cambiar el perfilado")
+            return self.handle_unknown()
+
+        try:
+            if valor is not None:
+                rate = {'on': 1.0, 'off': 0.0}.get(valor, None)
+                profiler.configure(sample_rate=rate if rate is not None else float(valor.replace(',', '.')), mode=modo)
+            elif modo is not None:
+                profiler.configure(mode=modo)
+        except ValueError as e:
+            return f"Valor de perfilado no válido: {e}"
+
+        return (f"Perfilado: tasa {profiler.sample_rate:g}, modo {profiler.mode}. "
+                f"Los perfiles se guardan en {profiler.output_dir}.")
+
+    def handle_municipio(self, nombre):
+        """Actualiza la ubicación si el mensaje es un municipio conocido"""
+        try:
+            municipio = self.weather.find_municipio(nombre)
+            if not municipio:
+                return "No se ha encontrado el municipio, intenta de nuevo."
+
+            self.current_municipality, self.current_location = municipio
+            update_location(self.current_municipality, self.current_location)
+            return f"Ubicación actualizada a {self.current_municipality}, código {self.current_location}."
+        except Exception as e:
+            logger.error(f"Error al cambiar ubicación: {e}")
+            return "Hubo un problema al actualizar la ubicación. Intenta más tarde."
+
+    @staticmethod
+    def handle_unknown():
+        """Respuesta para mensajes no reconocidos"""
+        return ("Lo siento, no entiendo tu mensaje. Prueba con 'tiempo', 'tiempo mañana', "
+                "'tiempo en <municipio>', 'eventos', 'renovar token' o 'cambiar ubicación'.")
+
     def setup_routes(self):
         """Configura rutas de Flask"""
+
+        @self.app.route('/ready', methods=['GET'])
+        def ready():
+            if self.caches_ready.is_set():
+                return {"status": "ready"}, 200
+            return {"status": "warming"}, 503
         
         @self.app.route('/whatsapp', methods=['POST'])
+        @profiler.profiled('whatsapp_reply')
         def whatsapp_reply():
             try:
-                incoming_msg = request.values.get('Body', '').strip().lower()
+                self.traffic_capture.record(request.values)
+                incoming_msg = request.values.get('Body', '')
                 resp = MessagingResponse()
-                msg = resp.message()
 
                 logger.info(f"Mensaje recibido: {incoming_msg}")
 
-                # Tiempo
-                if 'tiempo' in incoming_msg:
-                    if self.current_location:
-                        weather = self.weather.get_weather_from_aemet(self.current_location)
-                        
-                        if weather:
-                            lluvia_text = ', '.join(weather['intervalos_lluvia']) if weather['intervalos_lluvia'] else 'No hay probabilidad'
-                            msg.body(f"El tiempo del día en {self.current_municipality} es:\n\n"
-                                    f"Madrugada 🌄: {weather['madrugada']}\n"
-                                    f"Mañana 🌅: {weather['mañana']}\n"
-                                    f"Tarde 🌇: {weather['tarde']}\n"
-                                    f"Noche 🌆: {weather['noche']}\n\n"
-                                    f"Probabilidad de lluvia 🌧️: {lluvia_text}")
-                        else:
-                            msg.body("Hubo un problema al obtener el pronóstico. Intenta más tarde.")
-                    else:
-                        msg.body("No hay ubicación establecida. Usa 'cambiar ubicación'.")
-
-                # Eventos
-                elif 'eventos' in incoming_msg:
-                    try:
-                        # Verificar y refrescar token si es necesario
-                        self.check_and_refresh_token()
-                        
-                        events, birthdays, all_day_events = self.calendar.get_calendar_events()
-
-                        message = "Tus eventos del día son:\n"
-                        if events:
-                            for event in events:
-                                message += f"{event}\n"
-                        else:
-                            message += "No tienes eventos hoy.\n"
-                        
-                        if birthdays:
-                            message += "\n" + "\n".join(birthdays)
-                        
-                        if all_day_events:
-                            message += "\n" + "\n".join(all_day_events)
-
-                        msg.body(message)
-                    except Exception as e:
-                        logger.error(f"Error al obtener eventos: {e}")
-                        msg.body("Hubo un problema al obtener tus eventos. Intenta más tarde.")
-
-                # Cambiar ubicación
-                elif 'cambiar ubicación' in incoming_msg:
-                    msg.body("Escribe el nombre de tu municipio para actualizar la ubicación.")
-                
-                # Renovar token manualmente
-                elif 'renovar token' in incoming_msg:
-                    try:
-                        if self.check_and_refresh_token():
-                            msg.body("Token de Google Calendar verificado/renovado correctamente.")
-                        else:
-                            msg.body("No se pudo renovar el token. Es posible que necesites reautenticarte.")
-                    except Exception as e:
-                        logger.error(f"Error al renovar token manualmente: {e}")
-                        msg.body("Error al intentar renovar el token.")
-                
-                # Nombre de municipio
-                elif incoming_msg.replace(" ", "").isalpha():
-                    try:
-                        new_location = self.weather.get_municipio_code(incoming_msg.title())
-                        
-                        if new_location:
-                            self.current_municipality = incoming_msg.title()
-                            self.current_location = new_location
-                            update_location(self.current_municipality, self.current_location)
-                            msg.body(f"Ubicación actualizada a {self.current_municipality}, código {self.current_location}.")
-                        else:
-                            msg.body("No se ha encontrado el municipio, intenta de nuevo.")
-                    except Exception as e:
-                        logger.error(f"Error al cambiar ubicación: {e}")
-                        msg.body("Hubo un problema al actualizar la ubicación. Intenta más tarde.")
-
-                else:
-                    msg.body("Lo siento, no entiendo tu mensaje. Prueba con 'tiempo', 'eventos', 'renovar token' o 'cambiar ubicación'.")
-
+                reply = self.router.dispatch(incoming_msg, default=self.handle_unknown)
+                for message in pack_messages([reply]):
+                    resp.message(message)
                 return str(resp)
             except Exception as e:
                 logger.error(f"Error al procesar mensaje: {e}")
@@ -285,6 +423,15 @@ def main():
     """Función principal"""
     try:
         app = Main()
+
+        # Guardar cachés al terminar (SIGTERM en docker stop)
+        atexit.register(app.save_cache_snapshot)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        # Hilo para la precarga de cachés
+        warm_up_thread = threading.Thread(target=app.warm_up)
+        warm_up_thread.daemon = True
+        warm_up_thread.start()
         
         # Hilo para el programador
         scheduler_thread = threading.Thread(target=app.run_scheduler)
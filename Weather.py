@@ -1,13 +1,144 @@
 import os
+import time
+import threading
 import requests
 import pandas as pd
+import pytz
 import logging
-from config import MUNICIPALITIES_FILE
+from datetime import date, datetime, timedelta
+from config import MUNICIPALITIES_FILE, WEATHER_CACHE_TTL, TIMEZONE, AEMET_TIMEOUT
 from logging_config import setup_logger
+from profiling import profiler
 
 # Configurar logger
 logger = setup_logger(__name__)
 
+# Franjas de 6 horas usadas en el resumen diario
+FRANJAS_DIA = (
+    ("00-06", "madrugada"),
+    ("06-12", "mañana"),
+    ("12-18", "tarde"),
+    ("18-24", "noche"),
+)
+
+
+class PeriodoPrediccion:
+    """Predicción de un periodo del día (p. ej. '06-12')"""
+    __slots__ = ('periodo', 'cielo', 'prob_lluvia', 'temperatura', 'viento_dir', 'viento_vel')
+
+    def __init__(self, periodo):
+        self.periodo = periodo
+        self.cielo = None
+        self.prob_lluvia = None
+        self.temperatura = None
+        self.viento_dir = None
+        self.viento_vel = None
+
+    def to_list(self):
+        """Serializa el periodo en una lista compacta"""
+        return [getattr(self, campo) for campo in self.__slots__]
+
+    @classmethod
+    def from_list(cls, valores):
+        """Reconstruye un periodo serializado con to_list"""
+        periodo = cls(valores[0])
+        for campo, valor in zip(cls.__slots__[1:], valores[1:]):
+            setattr(periodo, campo, valor)
+        return periodo
+
+
+class DiaPrediccion:
+    """Predicción de un día con sus periodos ordenados"""
+    __slots__ = ('fecha', 'periodos', 'temp_max', 'temp_min', 'prob_lluvia_max')
+
+    def __init__(self, fecha, periodos, temp_max, temp_min, prob_lluvia_max):
+        self.fecha = fecha
+        self.periodos = periodos
+        self.temp_max = temp_max
+        self.temp_min = temp_min
+        self.prob_lluvia_max = prob_lluvia_max
+
+    def to_dict(self):
+        """Serializa el día para la instantánea de caché"""
+        return {
+            'fecha': self.fecha.isoformat(),
+            'periodos': [p.to_list() for p in self.periodos],
+            'temp_max': self.temp_max,
+            'temp_min': self.temp_min,
+            'prob_lluvia_max': self.prob_lluvia_max
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Reconstruye un día serializado con to_dict"""
+        return cls(
+            date.fromisoformat(data['fecha']),
+            tuple(PeriodoPrediccion.from_list(p) for p in data['periodos']),
+            data['temp_max'],
+            data['temp_min'],
+            data['prob_lluvia_max']
+        )
+
+    def cielo_predominante(self):
+        """Devuelve el estado del cielo más repetido en el día"""
+        descripciones = [p.cielo for p in self.periodos if p.cielo]
+        if not descripciones:
+            return "No disponible"
+        return max(descripciones, key=descripciones.count)
+
+
+class Prediccion:
+    """Predicción multi-día de un municipio ya decodificada"""
+    __slots__ = ('elaborado', 'obtenido', 'dias')
+
+    def __init__(self, elaborado, obtenido, dias):
+        self.elaborado = elaborado
+        self.obtenido = obtenido
+        self.dias = dias
+
+    def to_dict(self):
+        """Serializa la predicción para la instantánea de caché"""
+        return {
+            'elaborado': self.elaborado,
+            'obtenido': self.obtenido,
+            'dias': [dia.to_dict() for dia in self.dias]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Reconstruye una predicción serializada con to_dict"""
+        return cls(data['elaborado'], data['obtenido'], [DiaPrediccion.from_dict(d) for d in data['dias']])
+
+    def dia(self, fecha):
+        """Devuelve la predicción para una fecha o None"""
+        for dia in self.dias:
+            if dia.fecha == fecha:
+                return dia
+        return None
+
+    def rango(self, desde, hasta):
+        """Devuelve las predicciones entre dos fechas (incluidas)"""
+        return [dia for dia in self.dias if desde <= dia.fecha <= hasta]
+
+
+def fecha_hoy(timezone=TIMEZONE):
+    """Fecha de hoy en la zona horaria de la predicción, no en la del servidor"""
+    return datetime.now(pytz.timezone(timezone)).date()
+
+
+def _duracion_periodo(periodo):
+    """Horas que abarca un periodo 'HH-HH'"""
+    inicio, fin = periodo.split('-')
+    return int(fin) - int(inicio)
+
+
+def _valor_entero(valor):
+    """Convierte valores de AEMET ('' o '45') a int o None"""
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
 class Weather:
     def __init__(self, AEMET_API_KEY) -> None:
         """Inicializa la clase Weather"""
@@ -16,6 +147,14 @@ class Weather:
             raise ValueError("Se requiere AEMET_API_KEY")
             
         self.AEMET_API_KEY = AEMET_API_KEY
+
+        # Caché de predicciones por código de municipio
+        self.prediction_cache = {}
+        # Índice nombre de municipio -> código, se carga una sola vez
+        self.municipios_index = None
+        # Nombre en minúsculas -> nombre oficial, derivado del índice
+        self.municipios_lookup = None
+        self.cache_lock = threading.Lock()
         
         # Crear directorio para el archivo de municipios
         os.makedirs(os.path.dirname(MUNICIPALITIES_FILE), exist_ok=True)
@@ -27,40 +166,111 @@ class Weather:
                 logger.error(f"No se encontró {MUNICIPALITIES_FILE}")
                 raise FileNotFoundError(f"No se encontró {MUNICIPALITIES_FILE}")
                 
-            return pd.read_excel(MUNICIPALITIES_FILE)
+            with profiler.span('xlsx'):
+                return pd.read_excel(MUNICIPALITIES_FILE)
         except Exception as e:
             logger.error(f"Error al cargar Excel: {e}")
             raise
 
-    def get_municipio_code(self, municipality_name):
-        """Obtiene el código del municipio"""
-        if not municipality_name:
-            logger.error("Nombre de municipio vacío")
+    def load_municipios_index(self):
+        """Construye (una vez) el índice de municipios a partir del Excel"""
+        if self.municipios_index is not None:
+            return self.municipios_index
+
+        df = self.load_excel()
+        df = df.iloc[2:, :]  # Ignorar primeras dos filas
+        index = {}
+        for row in df.itertuples(index=False):
+            nombre = row[4]
+            if isinstance(nombre, str) and nombre not in index:
+                index[nombre] = str(row[1]) + str(row[2])
+
+        self.municipios_index = index
+        logger.info(f"Índice de municipios cargado: {len(index)} municipios")
+        return index
+
+    def find_municipio(self, texto):
+        """Busca un municipio sin distinguir mayúsculas y devuelve (nombre, código) o None"""
+        if not texto:
             return None
-            
+
         try:
-            df = self.load_excel()
-            df = df.iloc[2:, :]  # Ignorar primeras dos filas
-            row = df[df.iloc[:, 4] == municipality_name]
-
-            if not row.empty:
-                code = str(row.iloc[0, 1]) + str(row.iloc[0, 2])
-                logger.info(f"Código para {municipality_name}: {code}")
-                return code
-                
-            logger.warning(f"No se encontró código para: {municipality_name}")
-            return None
-            
+            index = self.load_municipios_index()
+            if self.municipios_lookup is None:
+                self.municipios_lookup = {nombre.lower(): nombre for nombre in index}
+
+            nombre = self.municipios_lookup.get(texto.strip().lower())
+            if not nombre:
+                logger.warning(f"No se encontró código para: {texto}")
+                return None
+            return nombre, index[nombre]
+
         except Exception as e:
             logger.error(f"Error al buscar municipio: {e}")
             return None
 
-    def get_weather_from_aemet(self, municipality_code):
-        """Obtiene pronóstico desde API AEMET"""
+    def export_cache(self):
+        """Devuelve las cachés calientes en formato serializable"""
+        with self.cache_lock:
+            predicciones = {code: p.to_dict() for code, p in self.prediction_cache.items()}
+        return {
+            'municipios': self.municipios_index,
+            'predicciones': predicciones
+        }
+
+    def import_cache(self, data):
+        """Restaura las cachés desde una instantánea"""
+        try:
+            if data.get('municipios') and self.municipios_index is None:
+                self.municipios_index = data['municipios']
+            predicciones = {code: Prediccion.from_dict(p) for code, p in data.get('predicciones', {}).items()}
+            with self.cache_lock:
+                self.prediction_cache.update(predicciones)
+            logger.info(f"Caché del tiempo restaurada: {len(predicciones)} predicciones")
+        except Exception as e:
+            logger.error(f"Error al restaurar caché del tiempo: {e}")
+
+    def warm_up(self, municipality_code):
+        """Precarga el índice de municipios y la predicción actual"""
+        self.load_municipios_index()
+        return self.get_prediccion(municipality_code) is not None
+
+    def get_weather_from_aemet(self, municipality_code, fecha=None):
+        """Obtiene el resumen del día (hoy por defecto) desde API AEMET"""
+        prediccion = self.get_prediccion(municipality_code)
+        if not prediccion:
+            return None
+
+        fecha = fecha or fecha_hoy()
+        dia = prediccion.dia(fecha)
+        if not dia:
+            logger.warning(f"No hay predicción para {fecha}")
+            return None
+        return self.resumen_dia(dia)
+
+    def get_prediccion(self, municipality_code):
+        """Devuelve la predicción multi-día, usando la caché si está vigente"""
         if not municipality_code:
             logger.error("Código de municipio vacío")
             return None
-            
+
+        with self.cache_lock:
+            prediccion = self.prediction_cache.get(municipality_code)
+        if prediccion and time.time() - prediccion.obtenido < WEATHER_CACHE_TTL:
+            return prediccion
+
+        prediccion_data = self.fetch_prediccion(municipality_code)
+        if prediccion_data is None:
+            return None
+
+        prediccion = self.procesar_prediccion(prediccion_data)
+        if prediccion:
+            with self.cache_lock:
+                self.prediction_cache[municipality_code] = prediccion
+        return prediccion
+
+    def fetch_prediccion(self, municipality_code):
+        """Descarga el JSON de predicción diaria desde API AEMET"""
         try:
             url = f'https://opendata.aemet.es/opendata/api/prediccion/especifica/municipio/diaria/{municipality_code}'
             headers = {
@@ -68,7 +278,8 @@ class Weather:
                 'api_key': self.AEMET_API_KEY
             }
             
-            response = requests.get(url, headers=headers)
+            with profiler.span('aemet'):
+                response = requests.get(url, headers=headers, timeout=AEMET_TIMEOUT)
 
             if response.status_code != 200:
                 logger.error(f"Error API AEMET: {response.status_code} - {response.text}")
@@ -76,66 +287,76 @@ class Weather:
                 
             data = response.json()
             datos_prediccion_url = data['datos']
-            prediccion_response = requests.get(datos_prediccion_url)
+            with profiler.span('aemet_datos'):
+                prediccion_response = requests.get(datos_prediccion_url, timeout=AEMET_TIMEOUT)
 
             if prediccion_response.status_code != 200:
                 logger.error(f"Error datos predicción: {prediccion_response.status_code}")
                 return None
             
-            prediccion_data = prediccion_response.json()
-            return self.procesar_datos_prediccion(prediccion_data)
+            return prediccion_response.json()
             
         except Exception as e:
             logger.error(f"Error al obtener datos del tiempo: {e}")
             return None
 
-    def procesar_datos_prediccion(self, prediccion_data):
-        """Procesa datos de predicción"""
+    def procesar_prediccion(self, prediccion_data):
+        """Decodifica una sola vez la respuesta de AEMET en días y periodos"""
         try:
-            dia = prediccion_data[0]['prediccion']['dia'][0]
+            prediccion = prediccion_data[0]
+            dias = [self.procesar_dia(dia) for dia in prediccion['prediccion']['dia']]
+            return Prediccion(prediccion.get('elaborado'), time.time(), dias)
+        except Exception as e:
+            logger.error(f"Error al procesar predicción: {e}")
+            return None
 
-            tiempo_madrugada = "No disponible"
-            tiempo_manana = "No disponible"
-            tiempo_tarde = "No disponible"
-            tiempo_noche = "No disponible"
-            
-            if 'estadoCielo' in dia and len(dia['estadoCielo']) >= 4:
-                estado_cielo = dia['estadoCielo'][-4:]
-            else:
-                estado_cielo = dia['estadoCielo']
+    def procesar_dia(self, dia):
+        """Convierte un día de AEMET en un DiaPrediccion"""
+        periodos = {}
 
-            for estado in estado_cielo:
-                periodo = estado['periodo']
-                descripcion = estado['descripcion']
+        def periodo_de(entrada):
+            return periodos.setdefault(entrada.get('periodo', '00-24'), PeriodoPrediccion(entrada.get('periodo', '00-24')))
 
-                if "00-06" in periodo:
-                    tiempo_madrugada = descripcion
-                elif "06-12" in periodo:
-                    tiempo_manana = descripcion
-                elif "12-18" in periodo:
-                    tiempo_tarde = descripcion
-                elif "18-24" in periodo:
-                    tiempo_noche = descripcion
+        for estado in dia.get('estadoCielo', []):
+            if estado.get('descripcion'):
+                periodo_de(estado).cielo = estado['descripcion']
 
-            prob_lluvia = dia['probPrecipitacion'][-4:]
-            intervalos_lluvia = []
+        for prob in dia.get('probPrecipitacion', []):
+            periodo_de(prob).prob_lluvia = _valor_entero(prob.get('value'))
 
-            for prob in prob_lluvia:
-                if int(prob['value']) > 50:
-                    intervalos_lluvia.append(prob['periodo'])
+        for viento in dia.get('viento', []):
+            periodo = periodo_de(viento)
+            periodo.viento_dir = viento.get('direccion') or None
+            periodo.viento_vel = _valor_entero(viento.get('velocidad'))
 
-            intervalos_consolidados = self.consolidar_intervalos(intervalos_lluvia)
+        # Quedarse con la franja más fina disponible (6h los primeros días, 12h o 24h después)
+        con_datos = [p for p in periodos.values() if p.cielo or p.prob_lluvia is not None]
+        if con_datos:
+            duracion = min(_duracion_periodo(p.periodo) for p in con_datos)
+            finos = sorted((p for p in con_datos if _duracion_periodo(p.periodo) == duracion),
+                           key=lambda p: p.periodo)
+        else:
+            finos = []
 
-            return {
-                "madrugada": tiempo_madrugada,
-                "mañana": tiempo_manana,
-                "tarde": tiempo_tarde,
-                "noche": tiempo_noche,
-                "intervalos_lluvia": intervalos_consolidados
-            }
-            
-        except Exception as e:
-            logger.error(f"Error al procesar predicción: {e}")
+        temperatura = dia.get('temperatura', {})
+        temperaturas_hora = {_valor_entero(d.get('hora')): _valor_entero(d.get('value'))
+                             for d in temperatura.get('dato', [])}
+        for periodo in finos:
+            periodo.temperatura = temperaturas_hora.get(int(periodo.periodo.split('-')[1]))
+
+        probabilidades = [p.prob_lluvia for p in periodos.values() if p.prob_lluvia is not None]
+
+        return DiaPrediccion(
+            date.fromisoformat(dia['fecha'][:10]),
+            tuple(finos),
+            _valor_entero(temperatura.get('maxima')),
+            _valor_entero(temperatura.get('minima')),
+            max(probabilidades) if probabilidades else None
+        )
+
+    def resumen_dia(self, dia):
+        """Resume un día en franjas de 6 horas e intervalos con lluvia"""
+        if dia is None:
             return {
                 "madrugada": "Error al procesar datos",
                 "mañana": "Error al procesar datos",
@@ -144,6 +365,41 @@ class Weather:
                 "intervalos_lluvia": []
             }
 
+        resumen = {nombre: "No disponible" for _, nombre in FRANJAS_DIA}
+        intervalos_lluvia = []
+
+        for periodo in dia.periodos:
+            inicio, fin = (int(h) for h in periodo.periodo.split('-'))
+            # Un periodo de 12h o 24h cubre varias franjas de 6h
+            for franja, nombre in FRANJAS_DIA:
+                franja_inicio, franja_fin = (int(h) for h in franja.split('-'))
+                if periodo.cielo and inicio <= franja_inicio and franja_fin <= fin:
+                    resumen[nombre] = periodo.cielo
+
+            if periodo.prob_lluvia is not None and periodo.prob_lluvia > 50:
+                intervalos_lluvia.append(periodo.periodo)
+
+        resumen["intervalos_lluvia"] = self.consolidar_intervalos(intervalos_lluvia)
+        resumen["temp_max"] = dia.temp_max
+        resumen["temp_min"] = dia.temp_min
+        return resumen
+
+    def get_resumen_dias(self, municipality_code, desde, hasta):
+        """Devuelve los días de la predicción entre dos fechas sin nuevas llamadas si hay caché"""
+        prediccion = self.get_prediccion(municipality_code)
+        if not prediccion:
+            return None
+        return prediccion.rango(desde, hasta)
+
+    @staticmethod
+    def fin_de_semana(hoy=None):
+        """Devuelve (sábado, domingo) del fin de semana actual o próximo"""
+        hoy = hoy or fecha_hoy()
+        sabado = hoy + timedelta(days=(5 - hoy.weekday()) % 7)
+        if hoy.weekday() == 6:
+            sabado = hoy - timedelta(days=1)
+        return sabado, sabado + timedelta(days=1)
+
     def consolidar_intervalos(self, intervalos):
         """Consolida intervalos consecutivos"""
         try:
@@ -0,0 +1,69 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from config import CACHE_SNAPSHOT_FILE, CACHE_SNAPSHOT_MAX_AGE
+from logging_config import setup_logger
+
+# Configurar logger
+logger = setup_logger(__name__)
+
+# Versión del formato de la instantánea
+SNAPSHOT_VERSION = 2
+
+# Serializa los guardados (programador, precarga y atexit)
+snapshot_lock = threading.Lock()
+
+# Crear directorio para el archivo de instantánea
+os.makedirs(os.path.dirname(CACHE_SNAPSHOT_FILE), exist_ok=True)
+
+def save_snapshot(collect_caches):
+    """Guarda en disco, de forma atómica, las cachés que devuelve collect_caches()"""
+    tmp_file = None
+    try:
+        with snapshot_lock:
+            data = {
+                'version': SNAPSHOT_VERSION,
+                'saved_at': time.time(),
+                'caches': collect_caches()
+            }
+            # Fichero temporal único en el mismo directorio para que os.replace sea atómico
+            fd, tmp_file = tempfile.mkstemp(
+                dir=os.path.dirname(CACHE_SNAPSHOT_FILE) or '.',
+                prefix=os.path.basename(CACHE_SNAPSHOT_FILE), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, CACHE_SNAPSHOT_FILE)
+            tmp_file = None
+        logger.info("Instantánea de caché guardada")
+        return True
+    except Exception as e:
+        logger.error(f"Error al guardar la instantánea de caché: {e}")
+        return False
+    finally:
+        if tmp_file and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def load_snapshot():
+    """Carga las cachés de disco si la instantánea es válida y reciente"""
+    try:
+        if not os.path.exists(CACHE_SNAPSHOT_FILE):
+            return None
+
+        with open(CACHE_SNAPSHOT_FILE, 'r') as f:
+            data = json.load(f)
+
+        if data.get('version') != SNAPSHOT_VERSION:
+            logger.warning(f"Versión de instantánea no soportada: {data.get('version')}")
+            return None
+
+        age = time.time() - data.get('saved_at', 0)
+        if age > CACHE_SNAPSHOT_MAX_AGE:
+            logger.warning(f"Instantánea de caché caducada ({int(age)} s)")
+            return None
+
+        return data.get('caches', {})
+    except Exception as e:
+        logger.error(f"Error al cargar la instantánea de caché: {e}")
+        return None
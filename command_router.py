@@ -0,0 +1,143 @@
+import re
+from logging_config import setup_logger
+
+# Configurar logger
+logger = setup_logger(__name__)
+
+# Palabras del mensaje: números (admite decimales) o palabras con apóstrofo/guion interno
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)?|[^\W_]+(?:['-][^\W_]+)*")
+
+# Mensaje formado solo por palabras (posible nombre de municipio)
+PLACE_PATTERN = re.compile(r"[^\W\d_]+(?:[\s'-]+[^\W\d_]+)*")
+
+# Expresiones temporales, de la más larga a la más corta
+CUANDO_FRASES = (
+    (('fin', 'de', 'semana'), 'fin de semana'),
+    (('finde',), 'fin de semana'),
+    (('mañana',), 'mañana'),
+    (('manana',), 'mañana'),
+    (('semana',), 'semana'),
+    (('hoy',), 'hoy'),
+)
+
+# Palabras que cierran el nombre de lugar que sigue a "en"
+LUGAR_FIN = {'por', 'porfa', 'para', 'hace', 'hará', 'hara', 'este', 'esta', 'ahora'}
+
+# Artículos y preposiciones que quedan al final del lugar cuando le sigue una
+# expresión temporal ("en Sevilla el fin de semana", "en Valencia de mañana")
+LUGAR_ENLACES = {'el', 'la', 'los', 'las', 'de', 'del'}
+
+def normalize_message(text):
+    """Pasa a minúsculas, quita puntuación de los extremos y colapsa espacios"""
+    return ' '.join(text.lower().strip('¿?¡!.,;: ').split())
+
+def tokenize(text):
+    """Divide el mensaje en palabras en minúsculas, sin puntuación"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+def _frase_en(tokens, i):
+    """Devuelve (longitud, valor) de la expresión temporal que empieza en i, o None"""
+    for frase, valor in CUANDO_FRASES:
+        if tuple(tokens[i:i + len(frase)]) == frase:
+            return len(frase), valor
+    return None
+
+def find_cuando(tokens):
+    """Primera expresión temporal del mensaje ('mañana', 'fin de semana'...) o None"""
+    for i in range(len(tokens)):
+        frase = _frase_en(tokens, i)
+        if frase:
+            return frase[1]
+    return None
+
+def find_lugar(tokens):
+    """Palabras que siguen a 'en' hasta una expresión temporal o una palabra de cierre"""
+    lugar = None
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        frase = _frase_en(tokens, i)
+        if frase:
+            if lugar:
+                # Solo al final: "El Escorial" conserva su artículo
+                while lugar and lugar[-1] in LUGAR_ENLACES:
+                    lugar.pop()
+                break
+            i += frase[0]
+            continue
+        if token == 'en' and lugar is None:
+            lugar = []
+        elif lugar is not None:
+            if token in LUGAR_FIN:
+                break
+            lugar.append(token)
+        i += 1
+    return ' '.join(lugar) if lugar else None
+
+class CommandRouter:
+    """Registro de comandos por palabra clave, resuelto en una sola pasada por el mensaje"""
+
+    def __init__(self) -> None:
+        self.commands = {}
+        self.index = {}
+        self.fallback = None
+
+    def register(self, name, keywords, handler, parse_args=None):
+        """Registra un comando; el orden de registro define la prioridad.
+
+        parse_args recibe las palabras del mensaje sin la palabra clave y
+        devuelve los argumentos del handler.
+        """
+        if name in self.commands:
+            raise ValueError(f"Comando duplicado: {name}")
+
+        priority = len(self.commands)
+        self.commands[name] = (priority, handler, parse_args)
+        for keyword in keywords:
+            phrase = tuple(tokenize(keyword))
+            if not phrase:
+                raise ValueError(f"Palabra clave vacía en {name}")
+            # Índice por primera palabra: cada posición del mensaje se mira una vez
+            self.index.setdefault(phrase[0], []).append((phrase, name))
+
+    def set_fallback(self, name, pattern, handler):
+        """Comando para mensajes sin palabra clave que encajan por completo con el patrón"""
+        self.fallback = (name, re.compile(pattern), handler)
+
+    def match(self, text):
+        """Devuelve (nombre, handler, argumentos) del comando que encaja o None"""
+        tokens = tokenize(text)
+
+        best = None
+        for i, token in enumerate(tokens):
+            for phrase, name in self.index.get(token, ()):
+                if tuple(tokens[i:i + len(phrase)]) != phrase:
+                    continue
+                priority = self.commands[name][0]
+                if best is None or priority < best[0]:
+                    best = (priority, name, i, i + len(phrase))
+
+        if best is not None:
+            _, name, start, end = best
+            _, handler, parse_args = self.commands[name]
+            kwargs = parse_args(tokens[:start] + tokens[end:]) if parse_args else {}
+            return name, handler, kwargs
+
+        if self.fallback:
+            name, pattern, handler = self.fallback
+            match = pattern.fullmatch(normalize_message(text))
+            if match:
+                return name, handler, match.groupdict()
+
+        return None
+
+    def dispatch(self, text, default=None):
+        """Invoca el handler del comando que encaja con el mensaje"""
+        result = self.match(text)
+        if result is None:
+            logger.info("Mensaje sin comando reconocido")
+            return default() if default else None
+
+        name, handler, kwargs = result
+        logger.info(f"Comando: {name} {kwargs}")
+        return handler(**kwargs)
@@ -37,3 +37,39 @@ STATE_FILE = 'data/app_state.json'
 
 # Configuración para renovación de token
 TOKEN_CHECK_INTERVAL = 20  # minutos
+
+# Vigencia de la caché de predicciones de AEMET
+WEATHER_CACHE_TTL = 3600  # segundos
+AEMET_TIMEOUT = 10  # segundos por petición a AEMET
+
+# Vigencia de la agenda del día en caché
+AGENDA_CACHE_TTL = 300  # segundos
+
+# Instantánea de cachés para arranque en caliente
+CACHE_SNAPSHOT_FILE = 'data/cache_snapshot.json'
+CACHE_SNAPSHOT_INTERVAL = 15  # minutos
+CACHE_SNAPSHOT_MAX_AGE = 86400  # segundos
+
+# Precarga de cachés al arrancar
+WARM_UP_DEADLINE = 120  # segundos antes de marcar la instancia como lista sin cachés
+WARM_UP_RETRY_INTERVAL = 10  # segundos entre reintentos
+
+# Captura de tráfico del webhook (desactivada si no se define el fichero)
+TRAFFIC_CAPTURE_FILE = os.getenv('TRAFFIC_CAPTURE_FILE')
+TRAFFIC_CAPTURE_SALT = os.getenv('TRAFFIC_CAPTURE_SALT', '')
+
+# Perfilado bajo demanda (desactivado con tasa 0)
+PROFILE_DIR = 'logs/profiles'
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'cprofile')  # 'cprofile' o 'sampling'
+PROFILE_SAMPLING_INTERVAL = 0.005  # segundos entre muestras en modo 'sampling'
+ADMIN_NUMBER = os.getenv('ADMIN_NUMBER', DEST_NUMBER)
+
+# URL pública del webhook tal y como la firma Twilio (si hay proxy delante)
+TWILIO_WEBHOOK_URL = os.getenv('TWILIO_WEBHOOK_URL')
+
+# Longitud máxima del cuerpo de un mensaje de WhatsApp en Twilio
+WHATSAPP_MAX_LENGTH = 1600
+
+# Eventos por página en las consultas a Google Calendar (máximo 2500)
+CALENDAR_PAGE_SIZE = 250
@@ -0,0 +1,120 @@
+from config import WHATSAPP_MAX_LENGTH
+from logging_config import setup_logger
+
+# Configurar logger
+logger = setup_logger(__name__)
+
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+# Separador entre secciones dentro de un mismo mensaje
+SECTION_SEPARATOR = '\n\n'
+
+def message_length(text):
+    """Longitud tal y como la cuenta WhatsApp/Twilio (unidades UTF-16, los emojis cuentan doble)"""
+    return len(text.encode('utf-16-le')) // 2
+
+def render_greeting(user_name, emoji):
+    """Saludo de la actualización diaria"""
+    return f"Buenos días {user_name}!! {emoji}"
+
+def render_weather(weather, municipality, titulo='del día', emoji=None):
+    """Resumen del tiempo por franjas a partir del diccionario de Weather.resumen_dia"""
+    intervalos_lluvia = weather['intervalos_lluvia']
+    lluvia_text = ', '.join(intervalos_lluvia) if intervalos_lluvia else 'No hay probabilidad de lluvia'
+    emoji_text = f" {emoji}" if emoji else ""
+    return (f"El tiempo {titulo} en {municipality} es{emoji_text}:\n\n"
+            f"Madrugada 🌄: {weather['madrugada']}\n"
+            f"Mañana 🌅: {weather['mañana']}\n"
+            f"Tarde 🌇: {weather['tarde']}\n"
+            f"Noche 🌆: {weather['noche']}\n\n"
+            f"Probabilidad de lluvia 🌧️: {lluvia_text}")
+
+def render_events(events, birthdays, all_day_events, cuando='hoy'):
+    """Agenda del día a partir de las listas de Calendar.get_calendar_events"""
+    message = f"Tus eventos {'de mañana' if cuando == 'mañana' else 'del día'} son 🗒️:\n"
+    if events:
+        message += '\n'.join(events) + '\n'
+    else:
+        message += f"No tienes eventos programados para {cuando}.\n"
+
+    if birthdays:
+        message += '\n' + '\n'.join(birthdays)
+    if all_day_events:
+        message += '\n' + '\n'.join(all_day_events)
+    return message.rstrip()
+
+def render_resumen_dias(titulo, municipality, dias):
+    """Una línea por día a partir de una lista de DiaPrediccion"""
+    lines = []
+    for dia in dias:
+        temperaturas = f", {dia.temp_min}º/{dia.temp_max}º" if dia.temp_max is not None else ""
+        lluvia = f", lluvia {dia.prob_lluvia_max}%" if dia.prob_lluvia_max else ""
+        lines.append(f"{DIAS_SEMANA[dia.fecha.weekday()]} {dia.fecha.day}: {dia.cielo_predominante()}{temperaturas}{lluvia}")
+    return f"El tiempo para {titulo} en {municipality} es:\n\n" + '\n'.join(lines)
+
+def _split_long_line(line, limit):
+    """Corta una línea que por sí sola supera el límite"""
+    chunks = []
+    current = ''
+    current_length = 0
+    for char in line:
+        char_length = message_length(char)
+        if current_length + char_length > limit:
+            chunks.append(current)
+            current, current_length = '', 0
+        current += char
+        current_length += char_length
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _pack(pieces, limit):
+    """Une las piezas (texto, longitud, separador previo) sin superar el límite por mensaje"""
+    packed = []
+    current = None
+    current_length = 0
+    for piece, piece_length, separator in pieces:
+        separator_length = message_length(separator)
+        if current is not None and current_length + separator_length + piece_length <= limit:
+            current += separator + piece
+            current_length += separator_length + piece_length
+        else:
+            if current is not None:
+                packed.append(current)
+            current, current_length = piece, piece_length
+    if current is not None:
+        packed.append(current)
+    return packed
+
+def _split_section(section, limit):
+    """Divide una sección demasiado larga en piezas por saltos de línea"""
+    pieces = []
+    separator = SECTION_SEPARATOR
+    for line in section.split('\n'):
+        line_length = message_length(line)
+        chunks = _split_long_line(line, limit) if line_length > limit else [line]
+        for chunk in chunks:
+            pieces.append((chunk, message_length(chunk), separator))
+            separator = '\n'
+    return pieces
+
+def pack_messages(sections, limit=WHATSAPP_MAX_LENGTH):
+    """Agrupa las secciones en el menor número de mensajes que no superen el límite.
+
+    Las secciones que caben en un mensaje no se parten; las que no caben se
+    reparten por líneas empezando en el hueco que quede en el mensaje actual.
+    """
+    pieces = []
+    for section in sections:
+        if not section:
+            continue
+        section_length = message_length(section)
+        if section_length > limit:
+            pieces.extend(_split_section(section, limit))
+        else:
+            pieces.append((section, section_length, SECTION_SEPARATOR))
+
+    messages = _pack(pieces, limit)
+    if len(messages) > 1:
+        logger.info(f"Contenido dividido en {len(messages)} mensajes")
+    return messages
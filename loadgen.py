@@ -0,0 +1,200 @@
+"""Generador de carga para el webhook /whatsapp.
+
+Reproduce un fichero capturado con TRAFFIC_CAPTURE_FILE o una mezcla sintética
+de intenciones contra una instancia en marcha y muestra throughput, tasa de
+error y percentiles de latencia por intención.
+
+Ejemplos:
+    python loadgen.py --url http://localhost:5000/whatsapp --log data/capture.jsonl
+    python loadgen.py --url http://localhost:5000/whatsapp --synthetic \\
+        --mix tiempo=50,eventos=30,municipio=10,unknown=10 --rate 20 --requests 500
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Mensajes de ejemplo por intención para la mezcla sintética
+SYNTHETIC_MESSAGES = {
+    'tiempo': ['tiempo', 'tiempo mañana', 'tiempo fin de semana', 'tiempo semana'],
+    'eventos': ['eventos'],
+    'municipio': ['Madrid', 'Sevilla', 'Valencia', 'Zaragoza'],
+    'unknown': ['hola', '¿qué tal?', '1234', 'gracias!'],
+}
+
+DEFAULT_MIX = 'tiempo=50,eventos=30,municipio=10,unknown=10'
+
+# El webhook responde siempre 200; los fallos internos llegan en el cuerpo
+ERROR_REPLY = 'Ha ocurrido un error'
+
+def classify_intent(body):
+    """Clasifica un mensaje en tiempo/eventos/municipio/unknown para el informe"""
+    text = body.strip().lower()
+    if 'tiempo' in text:
+        return 'tiempo'
+    if 'eventos' in text:
+        return 'eventos'
+    if text and text.replace(' ', '').isalpha():
+        return 'municipio'
+    return 'unknown'
+
+def parse_mix(mix):
+    """Convierte 'tiempo=50,eventos=30' en un diccionario de pesos"""
+    weights = {}
+    for item in mix.split(','):
+        intent, _, weight = item.partition('=')
+        intent = intent.strip()
+        if intent not in SYNTHETIC_MESSAGES:
+            raise ValueError(f"Intención desconocida: {intent}")
+        weights[intent] = float(weight or 1)
+    return weights
+
+def load_capture(path):
+    """Lee los payloads de un fichero de captura"""
+    payloads = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            payloads.append({
+                'Body': entry.get('b', ''),
+                'From': f"whatsapp:+000{entry.get('f', '')}",
+                'MessageSid': f"SM{entry.get('s') or uuid.uuid4().hex}"
+            })
+    return payloads
+
+def synthetic_payloads(weights, count, seed=None):
+    """Genera payloads sintéticos según la mezcla de intenciones"""
+    rng = random.Random(seed)
+    intents = list(weights)
+    payloads = []
+    for _ in range(count):
+        intent = rng.choices(intents, weights=[weights[i] for i in intents])[0]
+        payloads.append({
+            'Body': rng.choice(SYNTHETIC_MESSAGES[intent]),
+            'From': 'whatsapp:+34000000000',
+            'MessageSid': f"SM{uuid.uuid4().hex}"
+        })
+    return payloads
+
+def percentile(values, pct):
+    """Percentil por rango más cercano de una lista ordenada"""
+    if not values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(values))
+    return values[max(1, min(len(values), rank)) - 1]
+
+class LoadGenerator:
+    """Envía payloads al webhook a un ritmo y concurrencia dados"""
+
+    def __init__(self, url, rate, concurrency, timeout) -> None:
+        self.url = url
+        self.rate = rate
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.results = {}
+        self.send_elapsed = 0.0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def session(self):
+        """Una sesión HTTP por hilo para reutilizar conexiones"""
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def send(self, payload, scheduled):
+        """Envía un payload y registra latencia y resultado.
+
+        La latencia se mide desde el instante programado y no desde que un
+        hilo queda libre, para que la espera en cola cuente (omisión coordinada).
+        """
+        intent = classify_intent(payload['Body'])
+        try:
+            response = self.session().post(self.url, data=payload, timeout=self.timeout)
+            ok = response.status_code == 200 and ERROR_REPLY not in response.text
+        except requests.RequestException:
+            ok = False
+        latency = time.perf_counter() - scheduled
+
+        with self.lock:
+            stats = self.results.setdefault(intent, {'latencies': [], 'errors': 0})
+            stats['latencies'].append(latency)
+            if not ok:
+                stats['errors'] += 1
+
+    def run(self, payloads):
+        """Reproduce los payloads en bucle abierto al ritmo indicado"""
+        interval = 1.0 / self.rate if self.rate > 0 else 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for i, payload in enumerate(payloads):
+                scheduled = start + i * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.send, payload, scheduled)
+            self.send_elapsed = time.perf_counter() - start
+        return time.perf_counter() - start
+
+    def report(self, elapsed):
+        """Devuelve el informe de resultados como texto"""
+        lines = [f"{'intención':<10} {'n':>6} {'req/s':>8} {'error %':>8} "
+                 f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"]
+        total = 0
+        total_errors = 0
+        for intent in sorted(self.results):
+            stats = self.results[intent]
+            latencies = sorted(stats['latencies'])
+            count = len(latencies)
+            total += count
+            total_errors += stats['errors']
+            lines.append(
+                f"{intent:<10} {count:>6} {count / elapsed:>8.2f} {100 * stats['errors'] / count:>8.2f} "
+                f"{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 90) * 1000:>8.1f} "
+                f"{percentile(latencies, 99) * 1000:>8.1f} {latencies[-1] * 1000:>8.1f}")
+        if total:
+            lines.append(f"total: {total} peticiones en {elapsed:.1f} s "
+                         f"({total / elapsed:.2f} req/s, {100 * total_errors / total:.2f}% errores)")
+            if self.rate > 0 and self.send_elapsed > 0:
+                lines.append(f"ritmo objetivo: {self.rate:.2f} req/s, ritmo de envío: "
+                             f"{total / self.send_elapsed:.2f} req/s")
+        return '\n'.join(lines)
+
+def main(argv=None):
+    """Punto de entrada del generador de carga"""
+    parser = argparse.ArgumentParser(description="Generador de carga para el webhook /whatsapp")
+    parser.add_argument('--url', default='http://localhost:5000/whatsapp', help="URL del webhook")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--log', help="Fichero de captura a reproducir")
+    source.add_argument('--synthetic', action='store_true', help="Usar una mezcla sintética de intenciones")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Pesos por intención (tiempo,eventos,municipio,unknown)")
+    parser.add_argument('--requests', type=int, default=100, help="Número de peticiones sintéticas")
+    parser.add_argument('--rate', type=float, default=10.0, help="Peticiones por segundo (0 = sin límite)")
+    parser.add_argument('--concurrency', type=int, default=4, help="Peticiones simultáneas máximas")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Timeout por petición en segundos")
+    parser.add_argument('--seed', type=int, help="Semilla para la mezcla sintética")
+    args = parser.parse_args(argv)
+
+    if args.log:
+        payloads = load_capture(args.log)
+    else:
+        payloads = synthetic_payloads(parse_mix(args.mix), args.requests, args.seed)
+
+    if not payloads:
+        parser.error("No hay payloads que enviar")
+
+    generator = LoadGenerator(args.url, args.rate, args.concurrency, args.timeout)
+    elapsed = generator.run(payloads)
+    print(generator.report(elapsed))
+
+if __name__ == '__main__':
+    main()
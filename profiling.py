@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import random
+import cProfile
+import functools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from config import PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_MODE, PROFILE_SAMPLING_INTERVAL
+from logging_config import setup_logger
+
+# Configurar logger
+logger = setup_logger(__name__)
+
+PROFILE_MODES = ('cprofile', 'sampling')
+
+class StackSampler:
+    """Muestrea periódicamente la pila de un hilo y acumula pilas colapsadas"""
+
+    def __init__(self, thread_id, interval) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    @staticmethod
+    def frame_label(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self.frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def write_folded(self, path):
+        """Escribe las pilas en formato colapsado (flamegraph.pl, speedscope)"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class Profiler:
+    """Perfilado bajo demanda de peticiones y tareas programadas"""
+
+    def __init__(self, sample_rate=PROFILE_SAMPLE_RATE, mode=PROFILE_MODE, output_dir=PROFILE_DIR) -> None:
+        self.sample_rate = sample_rate
+        self.mode = mode if mode in PROFILE_MODES else 'cprofile'
+        self.output_dir = output_dir
+        self.local = threading.local()
+        # Solo un perfil a la vez: cProfile no admite perfiles simultáneos
+        self.active_lock = threading.Lock()
+
+    def configure(self, sample_rate=None, mode=None):
+        """Cambia la tasa de muestreo o el modo en caliente"""
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        if mode is not None:
+            if mode not in PROFILE_MODES:
+                raise ValueError(f"Modo de perfilado no válido: {mode}")
+            self.mode = mode
+        logger.info(f"Perfilado: tasa {self.sample_rate}, modo {self.mode}")
+
+    def should_sample(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def span(self, name):
+        """Mide una llamada a un servicio externo dentro del perfil activo"""
+        spans = getattr(self.local, 'spans', None)
+        if spans is None:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            spans.append({
+                'name': name,
+                'offset_ms': round((start - self.local.start) * 1000, 2),
+                'duration_ms': round((time.perf_counter() - start) * 1000, 2)
+            })
+
+    @contextmanager
+    def profile(self, name):
+        """Perfila el bloque si toca por muestreo y guarda el resultado en disco"""
+        # Las llamadas anidadas dentro de un perfil se registran como span
+        if getattr(self.local, 'spans', None) is not None:
+            with self.span(name):
+                yield
+            return
+
+        if not self.should_sample() or not self.active_lock.acquire(blocking=False):
+            yield
+            return
+
+        mode = self.mode
+        self.local.spans = []
+        self.local.start = time.perf_counter()
+        started_at = time.time()
+        if mode == 'sampling':
+            collector = StackSampler(threading.get_ident(), PROFILE_SAMPLING_INTERVAL)
+            collector.start()
+        else:
+            collector = cProfile.Profile()
+            collector.enable()
+
+        try:
+            yield
+        finally:
+            if mode == 'sampling':
+                collector.stop()
+            else:
+                collector.disable()
+            duration = time.perf_counter() - self.local.start
+            spans = self.local.spans
+            self.local.spans = None
+            self.active_lock.release()
+            self.write_profile(name, mode, collector, started_at, duration, spans)
+
+    def write_profile(self, name, mode, collector, started_at, duration, spans):
+        """Guarda el perfil (.prof o .folded) y el desglose de spans (.spans.json)"""
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(started_at))
+            base = os.path.join(self.output_dir, f"{name}-{stamp}-{int(started_at * 1000) % 1000:03d}-{os.getpid()}")
+
+            if mode == 'sampling':
+                collector.write_folded(f"{base}.folded")
+            else:
+                collector.dump_stats(f"{base}.prof")
+
+            with open(f"{base}.spans.json", 'w') as f:
+                json.dump({
+                    'name': name,
+                    'mode': mode,
+                    'started_at': started_at,
+                    'duration_ms': round(duration * 1000, 2),
+                    'spans': spans
+                }, f, indent=2)
+            logger.info(f"Perfil guardado: {base} ({duration * 1000:.0f} ms)")
+        except Exception as e:
+            logger.error(f"Error al guardar el perfil: {e}")
+
+    def profiled(self, name):
+        """Decorador que perfila la función según la tasa de muestreo"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.profile(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+# Perfilador compartido por toda la aplicación
+profiler = Profiler()
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from command_router import CommandRouter, find_cuando, find_lugar, tokenize
+from Main import Main
+
+
+@pytest.fixture
+def router():
+    """Router de Main con handlers que devuelven el comando y sus argumentos"""
+    app = Main.__new__(Main)
+    for name in ('tiempo', 'eventos', 'cambiar_ubicacion', 'renovar_token', 'perfilado', 'municipio'):
+        setattr(app, f'handle_{name}', lambda name=name, **kwargs: (name, kwargs))
+    app.setup_commands()
+    return app.router
+
+
+def route(router, text):
+    return router.dispatch(text, default=lambda: ('unknown', {}))
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('tiempo', ('tiempo', {'cuando': None, 'lugar': None})),
+    ('Tiempo mañana', ('tiempo', {'cuando': 'mañana', 'lugar': None})),
+    ('qué tiempo hace?', ('tiempo', {'cuando': None, 'lugar': None})),
+    ('el tiempo por favor', ('tiempo', {'cuando': None, 'lugar': None})),
+    ('tiempo, por favor', ('tiempo', {'cuando': None, 'lugar': None})),
+    ('tiempo este fin de semana', ('tiempo', {'cuando': 'fin de semana', 'lugar': None})),
+    ('tiempo para el fin de semana', ('tiempo', {'cuando': 'fin de semana', 'lugar': None})),
+    ('tiempo de mañana', ('tiempo', {'cuando': 'mañana', 'lugar': None})),
+    ('tiempo en Sevilla', ('tiempo', {'cuando': None, 'lugar': 'sevilla'})),
+    ('tiempo en Sevilla por favor', ('tiempo', {'cuando': None, 'lugar': 'sevilla'})),
+    ('tiempo en San Sebastián de los Reyes mañana',
+     ('tiempo', {'cuando': 'mañana', 'lugar': 'san sebastián de los reyes'})),
+    ('tiempo fin de semana en Madrid', ('tiempo', {'cuando': 'fin de semana', 'lugar': 'madrid'})),
+    ('tiempo en Sevilla el fin de semana', ('tiempo', {'cuando': 'fin de semana', 'lugar': 'sevilla'})),
+    ('tiempo en Madrid la semana que viene', ('tiempo', {'cuando': 'semana', 'lugar': 'madrid'})),
+    ('tiempo en Valencia de mañana', ('tiempo', {'cuando': 'mañana', 'lugar': 'valencia'})),
+    ('tiempo en El Escorial el finde', ('tiempo', {'cuando': 'fin de semana', 'lugar': 'el escorial'})),
+    ('eventos', ('eventos', {'cuando': None})),
+    ('Eventos mañana', ('eventos', {'cuando': 'mañana'})),
+    ('eventos de la semana', ('eventos', {'cuando': 'semana'})),
+    ('hola, ¿mis eventos?', ('eventos', {'cuando': None})),
+    ('cambiar ubicación', ('cambiar_ubicacion', {})),
+    ('quiero cambiar ubicación ya', ('cambiar_ubicacion', {})),
+    ('cambiar ubicacion', ('cambiar_ubicacion', {})),
+    ('renovar token', ('renovar_token', {})),
+    ('perfilado 0.5 sampling', ('perfilado', {'valor': '0.5', 'modo': 'sampling'})),
+    ('Madrid', ('municipio', {'nombre': 'madrid'})),
+    ('Alcalá de Henares', ('municipio', {'nombre': 'alcalá de henares'})),
+    ('1234', ('unknown', {})),
+    ('', ('unknown', {})),
+])
+def test_routes_messages(router, text, expected):
+    assert route(router, text) == expected
+
+
+def test_keyword_priority_follows_registration_order(router):
+    # Igual que la cadena original: 'tiempo' gana a 'eventos'
+    assert route(router, 'eventos y tiempo')[0] == 'tiempo'
+
+
+def test_keyword_messages_never_reach_municipio(router):
+    for text in ('el tiempo por favor', 'quiero cambiar ubicación ya', 'eventos de la semana'):
+        assert route(router, text)[0] != 'municipio'
+
+
+def test_classification_is_linear_in_message_length(router):
+    text = 'tiempo en a ' * 2000 + '1'  # 24k caracteres
+    start = time.perf_counter()
+    route(router, text)
+    route(router, 'a ' * 12000 + '1')
+    assert time.perf_counter() - start < 0.5
+
+
+def test_register_rejects_duplicates():
+    router = CommandRouter()
+    router.register('a', ['uno'], lambda: None)
+    with pytest.raises(ValueError):
+        router.register('a', ['dos'], lambda: None)
+
+
+def test_helpers():
+    assert tokenize('¿Tiempo, en L\'Hospitalet?') == ['tiempo', 'en', "l'hospitalet"]
+    assert find_cuando(['para', 'el', 'finde']) == 'fin de semana'
+    assert find_lugar(['mañana', 'en', 'el', 'escorial']) == 'el escorial'
+    assert find_lugar(['para', 'el', 'fin', 'de', 'semana']) is None
+    assert find_lugar(['en', 'el', 'fin', 'de', 'semana']) is None
+
+
+@pytest.mark.parametrize('cuando', ['semana', 'fin de semana'])
+def test_eventos_only_for_today_or_tomorrow(cuando):
+    app = Main.__new__(Main)
+    assert 'solo puedo mostrarte los eventos de hoy o de mañana' in app.handle_eventos(cuando)
@@ -0,0 +1,37 @@
+from digest import _split_long_line, _split_section, message_length, pack_messages
+
+
+def test_emoji_counts_as_two_utf16_units():
+    assert message_length('abc') == 3
+    assert message_length('🌧️') == 3  # emoji fuera del BMP + selector de variación
+    assert message_length('ñá') == 2
+
+
+def test_sections_that_fit_are_kept_whole():
+    assert pack_messages(['uno', '', 'dos'], limit=20) == ['uno\n\ndos']
+    assert pack_messages(['a' * 8, 'b' * 8], limit=10) == ['a' * 8, 'b' * 8]
+
+
+def test_oversized_section_is_split_on_line_boundaries():
+    section = '\n'.join(f"línea {i}" for i in range(10))  # 10 líneas de 7 caracteres
+    messages = pack_messages(['saludo', section], limit=30)
+    assert all(message_length(m) <= 30 for m in messages)
+    # La sección empieza en el hueco que deja el saludo y no se corta ninguna línea
+    assert messages[0].startswith('saludo\n\nlínea 0')
+    assert '\n'.join(messages).replace('saludo\n\n', '') == section
+
+
+def test_single_line_over_the_limit_is_cut():
+    assert _split_long_line('a' * 25, 10) == ['a' * 10, 'a' * 10, 'a' * 5]
+    pieces = _split_section('corta\n' + 'b' * 25, 10)
+    assert [p[0] for p in pieces] == ['corta', 'b' * 10, 'b' * 10, 'b' * 5]
+    assert all(length <= 10 for _, length, _ in pieces)
+
+
+def test_emoji_is_never_split_and_respects_the_limit():
+    line = '🌅' * 7  # 14 unidades UTF-16
+    chunks = _split_long_line(line, 5)
+    assert ''.join(chunks) == line
+    assert [message_length(c) for c in chunks] == [4, 4, 4, 2]
+    messages = pack_messages(['🌇' * 900], limit=1600)
+    assert [message_length(m) for m in messages] == [1600, 200]
@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+from loadgen import LoadGenerator, percentile
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 151))
+    assert percentile(values, 99) == 149
+    assert percentile(values, 50) == 75
+    assert percentile(values, 100) == 150
+    assert percentile([7], 99) == 7
+    assert percentile([], 99) == 0.0
+
+
+class FakeResponse:
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+
+    def post(self, url, data, timeout):
+        return self.response
+
+
+@pytest.mark.parametrize('response, errors', [
+    (FakeResponse('<Response><Message>Tus eventos del día son</Message></Response>'), 0),
+    (FakeResponse('<Response><Message>Ha ocurrido un error. Inténtalo más tarde.</Message></Response>'), 1),
+    (FakeResponse('', status_code=500), 1),
+])
+def test_error_replies_count_as_errors(response, errors):
+    generator = LoadGenerator('http://localhost/whatsapp', rate=0, concurrency=1, timeout=1)
+    generator.session = lambda: FakeSession(response)
+    generator.send({'Body': 'eventos'}, time.perf_counter())
+    assert generator.results['eventos']['errors'] == errors
+
+
+def test_latency_includes_time_waiting_for_a_worker():
+    generator = LoadGenerator('http://localhost/whatsapp', rate=0, concurrency=1, timeout=1)
+    generator.session = lambda: FakeSession(FakeResponse('ok'))
+    generator.send({'Body': 'tiempo'}, time.perf_counter() - 0.5)
+    assert generator.results['tiempo']['latencies'][0] >= 0.5
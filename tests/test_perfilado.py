@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+from flask import Flask
+from twilio.request_validator import RequestValidator
+
+import Main as main_module
+from profiling import profiler
+from traffic_capture import TrafficCapture
+
+AUTH_TOKEN = 'test-auth-token'
+ADMIN = 'whatsapp:+34600000000'
+URL = 'http://localhost/whatsapp'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Solo la parte web de Main: sin programador, Twilio, Calendar ni ficheros de estado"""
+    monkeypatch.setattr(main_module, 'ADMIN_NUMBER', ADMIN)
+    monkeypatch.setattr(main_module, 'TWILIO_WEBHOOK_URL', None)
+    monkeypatch.setattr(profiler, 'sample_rate', 0.0)
+    app = main_module.Main.__new__(main_module.Main)
+    app.app = Flask(main_module.__name__)
+    app.request_validator = RequestValidator(AUTH_TOKEN)
+    app.traffic_capture = TrafficCapture(capture_file=None)
+    app.caches_ready = threading.Event()
+    app.setup_commands()
+    app.setup_routes()
+    return app.app.test_client()
+
+
+def post(client, body, sender=ADMIN, signed=True):
+    data = {'Body': body, 'From': sender}
+    headers = {}
+    if signed:
+        headers['X-Twilio-Signature'] = RequestValidator(AUTH_TOKEN).compute_signature(URL, data)
+    return client.post('/whatsapp', data=data, headers=headers).data.decode()
+
+
+def test_signed_admin_request_changes_sample_rate(client):
+    assert 'tasa 0.5' in post(client, 'perfilado 0.5')
+    assert profiler.sample_rate == 0.5
+
+
+@pytest.mark.parametrize('sender, signed', [
+    (ADMIN, False),                       # From falsificado sin firma
+    ('whatsapp:+34699999999', True),      # firmado pero no es el administrador
+])
+def test_unauthorized_requests_are_ignored(client, sender, signed):
+    assert 'no entiendo tu mensaje' in post(client, 'perfilado on', sender=sender, signed=signed)
+    assert profiler.sample_rate == 0.0
@@ -0,0 +1,121 @@
+from datetime import date, datetime
+
+import pytest
+import pytz
+
+import Weather as weather_module
+from Weather import Weather, fecha_hoy
+
+
+# Respuesta de AEMET recortada: día con franjas de 6h, día de 12h y día de 24h
+PREDICCION = [{
+    'elaborado': '2026-10-19T08:00:00',
+    'prediccion': {'dia': [
+        {
+            'fecha': '2026-10-19T00:00:00',
+            'estadoCielo': [
+                {'value': '', 'periodo': '00-24', 'descripcion': ''},
+                {'value': '12', 'periodo': '00-12', 'descripcion': 'Poco nuboso'},
+                {'value': '12', 'periodo': '12-24', 'descripcion': 'Poco nuboso'},
+                {'value': '11', 'periodo': '00-06', 'descripcion': 'Despejado'},
+                {'value': '14', 'periodo': '06-12', 'descripcion': 'Nuboso'},
+                {'value': '25', 'periodo': '12-18', 'descripcion': 'Lluvia'},
+                {'value': '16', 'periodo': '18-24', 'descripcion': 'Cubierto'},
+            ],
+            'probPrecipitacion': [
+                {'value': 80, 'periodo': '00-24'},
+                {'value': 0, 'periodo': '00-06'},
+                {'value': 60, 'periodo': '06-12'},
+                {'value': 80, 'periodo': '12-18'},
+                {'value': '', 'periodo': '18-24'},
+            ],
+            'viento': [
+                {'direccion': 'N', 'velocidad': 10, 'periodo': '06-12'},
+                {'direccion': '', 'velocidad': '', 'periodo': '12-18'},
+            ],
+            'temperatura': {
+                'maxima': 20, 'minima': 9,
+                'dato': [{'value': 10, 'hora': 6}, {'value': 18, 'hora': 12}, {'value': 15, 'hora': 18}],
+            },
+        },
+        {
+            'fecha': '2026-10-21T00:00:00',
+            'estadoCielo': [
+                {'value': '', 'periodo': '00-24', 'descripcion': ''},
+                {'value': '15', 'periodo': '00-12', 'descripcion': 'Muy nuboso'},
+                {'value': '23', 'periodo': '12-24', 'descripcion': 'Intervalos nubosos con lluvia'},
+            ],
+            'probPrecipitacion': [
+                {'value': 70, 'periodo': '00-24'},
+                {'value': 20, 'periodo': '00-12'},
+                {'value': 70, 'periodo': '12-24'},
+            ],
+            'temperatura': {'maxima': 17, 'minima': 8},
+        },
+        {
+            'fecha': '2026-10-24T00:00:00',
+            'estadoCielo': [{'value': '12', 'descripcion': 'Poco nuboso'}],
+            'probPrecipitacion': [{'value': 5}],
+            'temperatura': {'maxima': '', 'minima': 11},
+        },
+    ]},
+}]
+
+
+@pytest.fixture
+def weather():
+    return Weather('aemet-key')
+
+
+@pytest.fixture
+def prediccion(weather):
+    return weather.procesar_prediccion(PREDICCION)
+
+
+def test_keeps_only_the_finest_periods(prediccion):
+    seis, doce, veinticuatro = prediccion.dias
+    assert [p.periodo for p in seis.periodos] == ['00-06', '06-12', '12-18', '18-24']
+    assert [p.periodo for p in doce.periodos] == ['00-12', '12-24']
+    assert [p.periodo for p in veinticuatro.periodos] == ['00-24']
+
+
+def test_period_fields_and_empty_values(prediccion):
+    madrugada, manana, tarde, noche = prediccion.dias[0].periodos
+    assert (manana.cielo, manana.prob_lluvia, manana.viento_dir, manana.viento_vel) == ('Nuboso', 60, 'N', 10)
+    assert (tarde.viento_dir, tarde.viento_vel) == (None, None)
+    assert noche.prob_lluvia is None
+    # La temperatura horaria se asigna a la franja que termina a esa hora
+    assert [p.temperatura for p in (madrugada, manana, tarde, noche)] == [10, 18, 15, None]
+    assert prediccion.dias[2].temp_max is None
+    assert prediccion.dias[2].temp_min == 11
+
+
+def test_day_summary(prediccion, weather):
+    assert prediccion.dias[0].prob_lluvia_max == 80
+    assert weather.resumen_dia(prediccion.dias[0]) == {
+        'madrugada': 'Despejado', 'mañana': 'Nuboso', 'tarde': 'Lluvia', 'noche': 'Cubierto',
+        'intervalos_lluvia': ['06-18'], 'temp_max': 20, 'temp_min': 9,
+    }
+    # Un periodo de 12h cubre dos franjas de 6h
+    resumen = weather.resumen_dia(prediccion.dias[1])
+    assert (resumen['madrugada'], resumen['noche']) == ('Muy nuboso', 'Intervalos nubosos con lluvia')
+    assert resumen['intervalos_lluvia'] == ['12-24']
+
+
+def test_snapshot_round_trip(prediccion):
+    copia = weather_module.Prediccion.from_dict(prediccion.to_dict())
+    assert [d.to_dict() for d in copia.dias] == [d.to_dict() for d in prediccion.dias]
+
+
+def test_today_uses_forecast_timezone(weather, prediccion, monkeypatch):
+    assert fecha_hoy() == datetime.now(pytz.timezone('Europe/Madrid')).date()
+
+    monkeypatch.setattr(weather, 'get_prediccion', lambda code: prediccion)
+    monkeypatch.setattr(weather_module, 'fecha_hoy', lambda: date(2026, 10, 19))
+    assert weather.get_weather_from_aemet('28079')['mañana'] == 'Nuboso'
+    assert weather.get_weather_from_aemet('28079', date(2026, 10, 20)) is None
+
+
+def test_weekend_dates():
+    assert Weather.fin_de_semana(date(2026, 10, 19)) == (date(2026, 10, 24), date(2026, 10, 25))
+    assert Weather.fin_de_semana(date(2026, 10, 25)) == (date(2026, 10, 24), date(2026, 10, 25))
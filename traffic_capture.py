@@ -0,0 +1,69 @@
+import os
+import re
+import json
+import time
+import hmac
+import hashlib
+import secrets
+import threading
+from config import TRAFFIC_CAPTURE_FILE, TRAFFIC_CAPTURE_SALT
+from logging_config import setup_logger
+
+# Configurar logger
+logger = setup_logger(__name__)
+
+# Patrones de datos personales que se ocultan en el cuerpo del mensaje
+PII_PATTERNS = (
+    (re.compile(r'[\w.+-]+@[\w-]+\.[\w.]+'), '<email>'),
+    (re.compile(r'\+?\d[\d\s-]{7,}\d'), '<telefono>'),
+)
+
+def redact_body(body):
+    """Oculta emails y teléfonos del cuerpo del mensaje"""
+    for pattern, replacement in PII_PATTERNS:
+        body = pattern.sub(replacement, body)
+    return body
+
+def pseudonymize(value, salt):
+    """Sustituye un identificador por un HMAC corto, estable mientras no cambie la sal"""
+    if not value:
+        return ''
+    return hmac.new(salt.encode(), value.encode(), hashlib.sha256).hexdigest()[:12]
+
+class TrafficCapture:
+    """Registra los payloads del webhook en un fichero JSON Lines"""
+
+    def __init__(self, capture_file=TRAFFIC_CAPTURE_FILE) -> None:
+        self.capture_file = capture_file
+        self.lock = threading.Lock()
+        self.salt = TRAFFIC_CAPTURE_SALT
+        if self.enabled and not self.salt:
+            # Sin sal, el hash de un teléfono se revierte por fuerza bruta
+            self.salt = secrets.token_hex(32)
+            logger.warning("TRAFFIC_CAPTURE_SALT no definida: se usa una sal aleatoria; "
+                           "los remitentes no serán comparables entre reinicios")
+        if self.enabled:
+            os.makedirs(os.path.dirname(capture_file) or '.', exist_ok=True)
+            logger.info(f"Captura de tráfico activada en {capture_file}")
+
+    @property
+    def enabled(self):
+        return bool(self.capture_file)
+
+    def record(self, values):
+        """Añade un payload (Body, From, MessageSid) ya anonimizado"""
+        if not self.enabled:
+            return
+        try:
+            entry = {
+                't': round(time.time(), 3),
+                'b': redact_body(values.get('Body', '')),
+                'f': pseudonymize(values.get('From', ''), self.salt),
+                's': pseudonymize(values.get('MessageSid', ''), self.salt)
+            }
+            line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+            with self.lock:
+                with open(self.capture_file, 'a') as f:
+                    f.write(line + '\n')
+        except Exception as e:
+            logger.error(f"Error al capturar tráfico: {e}")